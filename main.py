@@ -2,15 +2,31 @@ import json
 import requests
 import os
 import hashlib
+import mmap
 import re
+import sys
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from operator import attrgetter
 from lunar_python import Solar
 
+try:
+    import orjson # 可选依赖，仅用于读写缓存文件
+except ImportError:
+    orjson = None
+
 # ================= 配置项 =================
 DATA_URL = "https://cdn.jsdelivr.net/npm/chinese-days/dist/chinese-days.json"
 DATA_FILENAME = "chinese-days.json"
-TRADITIONAL_CACHE_FILENAME = "traditional_cache.json" # [新增] 民俗计算缓存文件
+DATA_HEADERS_FILENAME = "chinese-days.headers.json" # 上次下载的 ETag / Last-Modified，用于条件请求
+TRADITIONAL_CACHE_DIR = os.path.join(".cache", "traditional") # 民俗计算缓存，每年一个文件
+TRADITIONAL_CACHE_SCHEMA = 4 # 计算逻辑或缓存格式变化时递增，使旧缓存失效
+LUNAR_TABLE_FILENAME = "lunar_table.json" # 逐日农历数据表缓存
 OUTPUT_FILENAME = "chinese_holidays.ics"
+OUTPUT_HASH_FILENAME = "chinese_holidays.ics.hash" # 日历事件摘要及对应的更新时间
 TZ_ID = "Asia/Shanghai"
 
 TRADITIONAL_START_YEAR = 2025
@@ -50,6 +66,8 @@ FIXED_FESTIVALS_SOLAR = {
     "12-24": "平安夜",
     "12-25": "圣诞节"
 }
+# 预先拆出月、日，逐年展开时直接构造日期，不再逐个 strptime
+FIXED_FESTIVALS_SOLAR_MD = [(date_str, int(date_str[:2]), int(date_str[3:]), name) for date_str, name in FIXED_FESTIVALS_SOLAR.items()]
 
 # 2. 农历固定节日
 FIXED_FESTIVALS_LUNAR = {
@@ -69,6 +87,54 @@ FIXED_FESTIVALS_LUNAR = {
     (12, 24): "南方小年",
 }
 
+# 3. 逐日农历数据表中各列名称的编号表（下标 0 表示当天无此项）
+JIE_QI_NAMES = ("", "小寒", "大寒", "立春", "雨水", "惊蛰", "春分", "清明", "谷雨", "立夏", "小满", "芒种", "夏至",
+                "小暑", "大暑", "立秋", "处暑", "白露", "秋分", "寒露", "霜降", "立冬", "小雪", "大雪", "冬至")
+SHU_JIU_NAMES = ("", "一九", "二九", "三九", "四九", "五九", "六九", "七九", "八九", "九九")
+FU_NAMES = ("", "初伏", "中伏", "末伏")
+TIAN_GAN = ("甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸")
+DI_ZHI = ("子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥")
+LUNAR_TABLE_NAMES = {"jieqi": JIE_QI_NAMES, "shujiu": SHU_JIU_NAMES, "fu": FU_NAMES, "gan": TIAN_GAN, "zhi": DI_ZHI}
+LUNAR_TABLE_COLUMNS = ("month", "day", "jieqi", "shujiu", "fu", "gan", "zhi")
+
+# 4. ICS 输出中的固定片段，预先编码好直接写出
+ICS_CRLF = b"\r\n"
+ICS_VEVENT_BEGIN = b"BEGIN:VEVENT\r\n"
+ICS_VEVENT_END = b"END:VEVENT\r\n"
+ICS_VALARM_BEGIN = b"BEGIN:VALARM\r\nTRIGGER:-P1D\r\nACTION:DISPLAY\r\n"
+ICS_VALARM_END = b"END:VALARM\r\n"
+ICS_VCALENDAR_END = b"END:VCALENDAR"
+
+# 5. 比较新旧日历时需要忽略的易变字段，一次扫描全部去掉
+UPDATE_TIME_RE = re.compile(r"更新时间(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+VOLATILE_RE = re.compile(r"更新时间\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}|(?:DTSTAMP|LAST-MODIFIED|CREATED):.*")
+
+# ================= 数据结构 =================
+
+# 事件中反复出现的状态值统一驻留，所有事件共用同一个字符串对象
+STATUS_CONFIRMED = sys.intern("CONFIRMED")
+STATUS_TENTATIVE = sys.intern("TENTATIVE")
+TRANSP_TRANSPARENT = sys.intern("TRANSPARENT")
+TRANSP_OPAQUE = sys.intern("OPAQUE")
+
+@dataclass(slots=True)
+class Event:
+    dtstart: str
+    dtend: str
+    uid: str
+    created: str
+    description: str
+    summary: str
+    status: str
+    transp: str
+    is_allday: bool
+    alarm: str | None = None
+    sortkey: int = field(init=False)
+
+    def __post_init__(self):
+        # dtstart 为 YYYYMMDD 或 YYYYMMDDTHHMMSS，转成整数排序键，全天事件时分秒记为 0
+        self.sortkey = int(self.dtstart[:8]) * 1_000_000 + int(self.dtstart[9:15] or 0)
+
 # ================= 辅助函数 =================
 
 def get_week_name(date_obj):
@@ -83,6 +149,29 @@ def format_ics_date(dt_obj, is_full_day=True):
 def generate_uid(date_str, suffix):
     return f"{date_str}_{suffix}@365day.top"
 
+def parse_iso_date(date_str):
+    # 固定的 YYYY-MM-DD 格式，直接切片转整数，比 strptime 快得多
+    if len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-":
+        raise ValueError(f"无效日期: {date_str}")
+    return datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10]))
+
+def days_from_civil(year, month, day):
+    # 公历日期转为与 date.toordinal() 相同的序数，纯整数运算，不构造 datetime
+    y = year - 1 if month <= 2 else year
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 305
+
+def nth_weekday_ordinal(year, month, target_weekday, nth):
+    # 某月第 nth 个星期 target_weekday（0 为周一）的序数，超出当月返回 None
+    first = days_from_civil(year, month, 1)
+    next_first = days_from_civil(year + month // 12, month % 12 + 1, 1)
+    # 公元 1 年 1 月 1 日为周一，(序数 - 1) % 7 即 weekday()
+    target = first + (target_weekday - (first - 1)) % 7 + 7 * (nth - 1)
+    return target if target < next_first else None
+
 def get_now_utc_stamp():
     return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
 
@@ -92,19 +181,83 @@ def get_now_display():
 def calculate_file_md5(filepath):
     if not os.path.exists(filepath):
         return None
-    hash_md5 = hashlib.md5()
     with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "md5").hexdigest()
+        # Python 3.11 以下没有 file_digest，改为映射整个文件一次性计算（空文件无法映射）
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.md5().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.md5(mm).hexdigest()
 
 def fold_line(text):
-    result = []
-    while len(text) > 50:
-        result.append(text[:50])
-        text = " " + text[50:]
-    result.append(text)
-    return "\r\n".join(result)
+    # RFC 5545：每行最多 75 个八位字节，续行以空格开头；切分点退回到 UTF-8 字符边界
+    data = text.encode('utf-8')
+    parts = []
+    start, limit = 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start, limit = end, 74
+    parts.append(data[start:])
+    return b"\r\n ".join(parts)
+
+def load_cache_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def dump_cache_file(path, data):
+    # 缓存文件只给程序读，不缩进；orjson 的输出与下面的紧凑格式一致，两种环境写出的文件相同
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+def calculate_traditional_config_md5():
+    # 节日配置参与缓存键，增删改节日后对应年份自动重算
+    config = {
+        "schema": TRADITIONAL_CACHE_SCHEMA,
+        "solar": FIXED_FESTIVALS_SOLAR,
+        "lunar": [[m, d, name] for (m, d), name in FIXED_FESTIVALS_LUNAR.items()]
+    }
+    return hashlib.md5(json.dumps(config, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+def calculate_events_md5(events):
+    return hashlib.md5(json.dumps(events, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+def calculate_columns_md5(columns):
+    payload = json.dumps([columns[k] for k in LUNAR_TABLE_COLUMNS], separators=(",", ":"))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+def build_lunar_table(year):
+    # 一年内每天的农历数据按列存放（SoA），名称类字段存为上方编号表中的下标
+    columns = {k: [] for k in LUNAR_TABLE_COLUMNS}
+    curr = datetime(year, 1, 1)
+    while curr.year == year:
+        lunar = Solar.fromYmd(curr.year, curr.month, curr.day).getLunar()
+        shu_jiu = lunar.getShuJiu()
+        fu = lunar.getFu()
+        columns["month"].append(lunar.getMonth())
+        columns["day"].append(lunar.getDay())
+        columns["jieqi"].append(JIE_QI_NAMES.index(lunar.getJieQi()))
+        # 数九、三伏只记录每段的第一天
+        columns["shujiu"].append(SHU_JIU_NAMES.index(shu_jiu.getName()) if shu_jiu and shu_jiu.getIndex() == 1 else 0)
+        columns["fu"].append(FU_NAMES.index(fu.getName()) if fu and fu.getIndex() == 1 else 0)
+        columns["gan"].append(lunar.getDayGanIndex())
+        columns["zhi"].append(lunar.getDayZhiIndex())
+        curr += timedelta(days=1)
+    return columns
+
+def find_index(values, target, start, span):
+    for i in range(start, min(start + span, len(values))):
+        if values[i] == target:
+            return i
+    return None
 
 class CalendarGenerator:
     def __init__(self):
@@ -112,11 +265,26 @@ class CalendarGenerator:
         self.raw_data = {}
         self.holiday_groups = {} 
         self.traditional_cache_list = [] # [新增] 用于暂存计算结果
+        self.lunar_tables = {} # 按年份存放的逐日农历数据表
+        self.now_stamp = get_now_utc_stamp() # 本次运行统一使用的 UTC 时间戳
         
     def ensure_data_file(self):
         print(f"正在检查法定假日数据更新: {DATA_URL}")
         try:
-            resp = requests.get(DATA_URL, timeout=30)
+            # 带上次的 ETag / Last-Modified 做条件请求，数据未变时服务器直接返回 304
+            headers = {}
+            if os.path.exists(DATA_FILENAME) and os.path.exists(DATA_HEADERS_FILENAME):
+                with open(DATA_HEADERS_FILENAME, 'r', encoding='utf-8') as f:
+                    saved_headers = json.load(f)
+                if saved_headers.get("etag"): headers["If-None-Match"] = saved_headers["etag"]
+                if saved_headers.get("last_modified"): headers["If-Modified-Since"] = saved_headers["last_modified"]
+
+            resp = requests.get(DATA_URL, headers=headers, timeout=30)
+            if resp.status_code == 304:
+                print("法定假日数据未变化 (304)，直接使用本地缓存。")
+                with open(DATA_FILENAME, 'r', encoding='utf-8') as f:
+                    self.raw_data = json.load(f)
+                return
             resp.raise_for_status()
             remote_content = resp.content
             remote_hash = hashlib.md5(remote_content).hexdigest()
@@ -128,6 +296,13 @@ class CalendarGenerator:
                     f.write(remote_content)
             else:
                 print("法定假日本地缓存已是最新。")
+
+            new_headers = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified")
+            }
+            with open(DATA_HEADERS_FILENAME, 'w', encoding='utf-8') as f:
+                json.dump(new_headers, f, ensure_ascii=False, indent=2)
             
             self.raw_data = json.loads(remote_content)
             
@@ -143,23 +318,21 @@ class CalendarGenerator:
     def parse_holidays(self):
         holidays_map = self.raw_data.get('holidays', {})
         workdays_map = self.raw_data.get('workdays', {})
-        temp_groups = {}
+        temp_groups = defaultdict(lambda: {'holidays': [], 'workdays': []})
 
         def process_dates(date_map, is_workday):
             for date_str, val in date_map.items():
                 cn_name = ""
                 if isinstance(val, str):
-                    parts = val.split(',')
+                    parts = val.split(',', 2) # 只需要第二段中文名
                     if len(parts) >= 2: cn_name = parts[1]
                 elif isinstance(val, dict):
                     cn_name = val.get('name', '')
                 
                 if not cn_name: continue
-                if cn_name not in temp_groups:
-                    temp_groups[cn_name] = {'holidays': [], 'workdays': []}
                 
                 try:
-                    dt = datetime.strptime(date_str, "%Y-%m-%d")
+                    dt = parse_iso_date(date_str)
                     if is_workday: temp_groups[cn_name]['workdays'].append(dt)
                     else: temp_groups[cn_name]['holidays'].append(dt)
                 except ValueError: continue
@@ -169,7 +342,7 @@ class CalendarGenerator:
         if not holidays_map and not workdays_map and self.raw_data:
             process_dates(self.raw_data, is_workday=False)
 
-        self.holiday_groups = temp_groups
+        self.holiday_groups = dict(temp_groups)
 
     def get_consecutive_blocks(self, dates):
         if not dates: return []
@@ -186,7 +359,6 @@ class CalendarGenerator:
         return blocks
 
     def process_holiday_events(self):
-        now_stamp = get_now_utc_stamp()
         for name, data in self.holiday_groups.items():
             all_h_dates = data['holidays']
             all_w_dates = sorted(list(set(data['workdays'])))
@@ -196,44 +368,43 @@ class CalendarGenerator:
                 start_dt = block[0]
                 end_dt = block[-1]
                 
-                related_workdays = []
-                check_start = start_dt - timedelta(days=20)
-                check_end = end_dt + timedelta(days=20)
-                for wd in all_w_dates:
-                    if check_start <= wd <= check_end: related_workdays.append(wd)
+                # all_w_dates 已排序，二分定位前后 20 天内的补班日
+                lo = bisect_left(all_w_dates, start_dt - timedelta(days=20))
+                hi = bisect_right(all_w_dates, end_dt + timedelta(days=20))
+                related_workdays = all_w_dates[lo:hi]
                 
                 description = self.generate_block_description(name, block, related_workdays)
                 ics_end_dt = end_dt + timedelta(days=1)
                 
-                self.events.append({
-                    "dtstart": format_ics_date(start_dt),
-                    "dtend": format_ics_date(ics_end_dt),
-                    "uid": generate_uid(start_dt.strftime("%Y%m%d"), "holiday_block"),
-                    "created": now_stamp,
-                    "description": description,
-                    "summary": f"{name} 假期",
-                    "status": "CONFIRMED",
-                    "transp": "TRANSPARENT",
-                    "is_allday": True
-                })
+                self.events.append(Event(
+                    dtstart=format_ics_date(start_dt),
+                    dtend=format_ics_date(ics_end_dt),
+                    uid=generate_uid(start_dt.strftime("%Y%m%d"), "holiday_block"),
+                    created=self.now_stamp,
+                    description=description,
+                    summary=f"{name} 假期",
+                    status=STATUS_CONFIRMED,
+                    transp=TRANSP_TRANSPARENT,
+                    is_allday=True
+                ))
 
                 for i, wd in enumerate(related_workdays):
                     w_summary = f"{name} 补班"
                     w_start = wd.replace(hour=9, minute=0, second=0)
                     w_end = wd.replace(hour=18, minute=0, second=0)
                     
-                    self.events.append({
-                        "dtstart": format_ics_date(w_start, False),
-                        "dtend": format_ics_date(w_end, False),
-                        "uid": generate_uid(wd.strftime("%Y%m%d"), f"work_{i}"),
-                        "created": now_stamp,
-                        "description": description,
-                        "summary": w_summary,
-                        "status": "TENTATIVE",
-                        "transp": "OPAQUE",
-                        "is_allday": False,
-                        "alarm": f"补班提醒：{w_summary}"
-                    })
+                    self.events.append(Event(
+                        dtstart=format_ics_date(w_start, False),
+                        dtend=format_ics_date(w_end, False),
+                        uid=generate_uid(wd.strftime("%Y%m%d"), f"work_{i}"),
+                        created=self.now_stamp,
+                        description=description,
+                        summary=w_summary,
+                        status=STATUS_TENTATIVE,
+                        transp=TRANSP_OPAQUE,
+                        is_allday=False,
+                        alarm=f"补班提醒：{w_summary}"
+                    ))
 
     def generate_block_description(self, name, h_dates, w_dates):
         if not h_dates: return ""
@@ -248,165 +419,235 @@ class CalendarGenerator:
         return desc
 
     # [新增] 专门用于记录缓存的包裹函数
-    def _record_traditional_event(self, start_dt, end_dt, summary, description="", is_allday=True):
+    def _record_traditional_event(self, start_dt, end_dt, summary, description="", is_allday=True, ymd_str=None, uid_seed=None):
+        uid_hash = self.create_event(start_dt, end_dt, summary, description, is_allday, ymd_str, uid_seed)
         self.traditional_cache_list.append({
-            "start": start_dt.strftime("%Y%m%d"),
-            "end": end_dt.strftime("%Y%m%d"),
+            "start": [start_dt.year, start_dt.month, start_dt.day],
+            "end": [end_dt.year, end_dt.month, end_dt.day],
             "summary": summary,
             "description": description,
-            "is_allday": is_allday
+            "is_allday": is_allday,
+            "uid": uid_hash
         })
-        self.create_event(start_dt, end_dt, summary, description, is_allday)
+
+    def _record_traditional_events(self, start_dt, items):
+        # 同一天的多个全天事件共用一次日期格式化和已喂入日期前缀的 md5
+        end_dt = start_dt + timedelta(days=1)
+        ymd_str = start_dt.strftime("%Y%m%d")
+        uid_seed = hashlib.md5(f"{ymd_str}-".encode())
+        for summary, description in items:
+            self._record_traditional_event(start_dt, end_dt, summary, description, True, ymd_str, uid_seed)
 
     def add_traditional_events(self):
-        # [新增] 1. 优先检查并读取本地缓存
-        if os.path.exists(TRADITIONAL_CACHE_FILENAME):
+        # 按年份分片缓存，只重新计算缺失或失效的年份（例如延长结束年份时只算新增的几年）
+        config_md5 = calculate_traditional_config_md5()
+        cached_years = {}
+        for year in range(TRADITIONAL_START_YEAR, TRADITIONAL_END_YEAR + 1):
+            events = self.load_traditional_year_cache(year, config_md5)
+            if events is not None: cached_years[year] = events
+
+        missing_years = [y for y in range(TRADITIONAL_START_YEAR, TRADITIONAL_END_YEAR + 1) if y not in cached_years]
+        if missing_years:
+            print(f"正在深度计算民俗/动态/传统节日 (共 {len(missing_years)} 个年份)，这需要一点时间...")
+            stored_tables = self.load_lunar_tables(missing_years)
+            tables = [self.lunar_tables.get(y) for y in missing_years]
+            build_count = tables.count(None)
+            if build_count > 1:
+                # 逐日农历计算是纯 Python、受 GIL 限制，各年份互不依赖，交给多进程并行
+                with ProcessPoolExecutor() as executor:
+                    results = list(executor.map(compute_traditional_year, missing_years, tables))
+            else:
+                results = [compute_traditional_year(y, t) for y, t in zip(missing_years, tables)]
+
+            for year, (table, events) in zip(missing_years, results):
+                self.lunar_tables[year] = table
+                stored_tables[str(year)] = table
+                cached_years[year] = events
+                self.save_traditional_year_cache(year, config_md5, events)
+            if build_count:
+                self.save_lunar_tables(stored_tables)
+        else:
+            print("检测到匹配的民俗/传统节日缓存，直接加载，跳过复杂计算...")
+
+        for year in range(TRADITIONAL_START_YEAR, TRADITIONAL_END_YEAR + 1):
+            for ev in cached_years[year]:
+                # 缓存中的日期直接存为 [年, 月, 日]，无需再解析字符串
+                start_dt = datetime(*ev["start"])
+                end_dt = datetime(*ev["end"])
+                self.create_event(start_dt, end_dt, ev["summary"], ev["description"], ev["is_allday"], uid_hash=ev["uid"])
+
+    def load_traditional_year_cache(self, year, config_md5):
+        cache_path = os.path.join(TRADITIONAL_CACHE_DIR, f"traditional_cache_{year}.json")
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            cache_data = load_cache_file(cache_path)
+        except Exception as e:
+            print(f"读取 {year} 年民俗缓存失败: {e}，将重新计算...")
+            return None
+
+        # 节日配置或缓存格式变化、内容校验不通过时都视为失效
+        events = cache_data.get("events", [])
+        if cache_data.get("schema") != TRADITIONAL_CACHE_SCHEMA or cache_data.get("config") != config_md5 or \
+           cache_data.get("md5") != calculate_events_md5(events):
+            return None
+        return events
+
+    def save_traditional_year_cache(self, year, config_md5, events):
+        os.makedirs(TRADITIONAL_CACHE_DIR, exist_ok=True)
+        cache_data = {
+            "schema": TRADITIONAL_CACHE_SCHEMA,
+            "year": year,
+            "config": config_md5,
+            "md5": calculate_events_md5(events),
+            "events": events
+        }
+        dump_cache_file(os.path.join(TRADITIONAL_CACHE_DIR, f"traditional_cache_{year}.json"), cache_data)
+
+    def add_traditional_year(self, year):
+        for date_str, month, day, name in FIXED_FESTIVALS_SOLAR_MD:
             try:
-                with open(TRADITIONAL_CACHE_FILENAME, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
+                dt = datetime(year, month, day)
                 
-                # 校验缓存的年份范围是否匹配，如果匹配则直接加载
-                if cache_data.get("start_year") == TRADITIONAL_START_YEAR and \
-                   cache_data.get("end_year") == TRADITIONAL_END_YEAR:
-                    print("检测到匹配的民俗/传统节日缓存，直接加载，跳过复杂计算...")
-                    for ev in cache_data.get("events", []):
-                        start_dt = datetime.strptime(ev["start"], "%Y%m%d")
-                        end_dt = datetime.strptime(ev["end"], "%Y%m%d")
-                        self.create_event(start_dt, end_dt, ev["summary"], ev["description"], ev.get("is_allday", True))
-                    return
+                # 1. 处理香港回归 (7月1日与建党节同日，需要保留建党节并额外添加回归日)
+                if date_str == "07-01":
+                    items = [(name, "公历节日")] # 保留建党节
+                    anniversary = year - 1997
+                    if anniversary > 0: 
+                        items.append((f"香港回归纪念日({anniversary}周年)", "纪念日"))
+                        
+                # 2. 处理澳门回归
+                elif date_str == "12-20":
+                    anniversary = year - 1999
+                    if anniversary > 0: 
+                        items = [(f"澳门回归纪念日({anniversary}周年)", "纪念日")]
+                    else:
+                        items = [(name, "公历节日")] # 1999年及以前兜底用原名
+                        
+                # 3. 其他常规公历节日正常添加
                 else:
-                    print("缓存年份范围已改变，准备重新计算...")
-            except Exception as e:
-                print(f"读取民俗缓存失败: {e}，将重新计算...")
+                    items = [(name, "公历节日")]
 
-        # 2. 如果无缓存或缓存失效，则进行逐日计算
-        print(f"正在深度计算民俗/动态/传统节日 ({TRADITIONAL_START_YEAR}-{TRADITIONAL_END_YEAR})，这需要一点时间...")
-        self.traditional_cache_list = [] # 清空缓存列表准备记录
-
-        for year in range(TRADITIONAL_START_YEAR, TRADITIONAL_END_YEAR + 1):
-            for date_str, name in FIXED_FESTIVALS_SOLAR.items():
-                try:
-                    dt = datetime.strptime(f"{year}-{date_str}", "%Y-%m-%d")
+                self._record_traditional_events(dt, items)
                     
-                    # 1. 处理香港回归 (7月1日与建党节同日，需要保留建党节并额外添加回归日)
-                    if date_str == "07-01":
-                        self._record_traditional_event(dt, dt + timedelta(days=1), name, "公历节日") # 保留建党节
-                        anniversary = year - 1997
-                        if anniversary > 0: 
-                            self._record_traditional_event(dt, dt + timedelta(days=1), f"香港回归纪念日({anniversary}周年)", "纪念日")
-                            
-                    # 2. 处理澳门回归
-                    elif date_str == "12-20":
-                        anniversary = year - 1999
-                        if anniversary > 0: 
-                            self._record_traditional_event(dt, dt + timedelta(days=1), f"澳门回归纪念日({anniversary}周年)", "纪念日")
-                        else:
-                            self._record_traditional_event(dt, dt + timedelta(days=1), name, "公历节日") # 1999年及以前兜底用原名
-                            
-                    # 3. 其他常规公历节日正常添加
-                    else:
-                        self._record_traditional_event(dt, dt + timedelta(days=1), name, "公历节日")
-                        
-                except ValueError: pass
-
-            self.create_dynamic_solar_event(year, 5, 6, 2, "母亲节")
-            self.create_dynamic_solar_event(year, 6, 6, 3, "父亲节")
-            tg_date = self.create_dynamic_solar_event(year, 11, 3, 4, "感恩节")
-            if tg_date:
-                bf_date = tg_date + timedelta(days=1)
-                self._record_traditional_event(bf_date, bf_date + timedelta(days=1), "黑色星期五", "商业节日")
-
-            curr = datetime(year, 1, 1)
-            end_dt = datetime(year, 12, 31)
-            looking_for_rumei = False
-            looking_for_chumei = False
-            
-            while curr <= end_dt:
-                solar = Solar.fromYmd(curr.year, curr.month, curr.day)
-                lunar = solar.getLunar()
-                l_month, l_day = lunar.getMonth(), lunar.getDay()
-                
-                jie_qi = lunar.getJieQi()
-                if jie_qi:
-                    self._record_traditional_event(curr, curr + timedelta(days=1), jie_qi, "二十四节气")
-                    if jie_qi == "芒种": looking_for_rumei = True
-                    if jie_qi == "小暑": looking_for_chumei = True
-
-                if looking_for_rumei and lunar.getDayGan() == "丙":
-                    self._record_traditional_event(curr, curr + timedelta(days=1), "入梅", "节气民俗")
-                    looking_for_rumei = False 
-                
-                if looking_for_chumei and lunar.getDayZhi() == "未":
-                    self._record_traditional_event(curr, curr + timedelta(days=1), "出梅", "节气民俗")
-                    looking_for_chumei = False 
-
-                if lunar.getShuJiu() and lunar.getShuJiu().getIndex() == 1:
-                    name = lunar.getShuJiu().getName()
-                    if name in ["一九", "二九", "三九", "四九", "五九", "六九", "七九", "八九", "九九"]:
-                        title = "一九" if name == "一九" else name
-                        self._record_traditional_event(curr, curr + timedelta(days=1), title, "节气民俗")
-
-                if lunar.getFu() and lunar.getFu().getIndex() == 1:
-                    fu_name = "入伏" if lunar.getFu().getName() == "初伏" else lunar.getFu().getName()
-                    self._record_traditional_event(curr, curr + timedelta(days=1), fu_name, "节气民俗")
-
-                if l_day == 1:
-                    m_name = lunar.getMonthInChinese()
-                    if m_name in ["正", "冬", "腊"]:
-                        self._record_traditional_event(curr, curr + timedelta(days=1), f"进入{m_name}月", "农历月份")
-
-                if (l_month, l_day) in FIXED_FESTIVALS_LUNAR:
-                    self._record_traditional_event(curr, curr + timedelta(days=1), FIXED_FESTIVALS_LUNAR[(l_month, l_day)], "传统节日")
-                
-                tomorrow_lunar = Solar.fromYmd((curr + timedelta(days=1)).year, (curr + timedelta(days=1)).month, (curr + timedelta(days=1)).day).getLunar()
-                if tomorrow_lunar.getJieQi() == "清明":
-                    self._record_traditional_event(curr, curr + timedelta(days=1), "寒食节", "传统节日")
+            except ValueError: pass
 
-                if l_month == 1 and l_day == 1:
-                    self._record_traditional_event(curr, curr + timedelta(days=1), "春节", "传统节日")
-                if tomorrow_lunar.getMonth() == 1 and tomorrow_lunar.getDay() == 1:
-                    self._record_traditional_event(curr, curr + timedelta(days=1), "除夕", "传统节日")
+        self.create_dynamic_solar_event(year, 5, 6, 2, "母亲节")
+        self.create_dynamic_solar_event(year, 6, 6, 3, "父亲节")
+        tg_date = self.create_dynamic_solar_event(year, 11, 3, 4, "感恩节")
+        if tg_date:
+            bf_date = tg_date + timedelta(days=1)
+            self._record_traditional_event(bf_date, bf_date + timedelta(days=1), "黑色星期五", "商业节日")
 
-                curr += timedelta(days=1)
-                
-        # [新增] 3. 循环结束后，将记录的内容写入本地缓存文件
-        print("计算完毕，正在保存民俗/传统节日缓存...")
-        cache_data = {
-            "start_year": TRADITIONAL_START_YEAR,
-            "end_year": TRADITIONAL_END_YEAR,
-            "events": self.traditional_cache_list
-        }
-        with open(TRADITIONAL_CACHE_FILENAME, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        self.add_lunar_table_events(year, self.lunar_tables[year])
 
     def create_dynamic_solar_event(self, year, month, target_weekday, nth, name):
-        first_day = datetime(year, month, 1)
-        delta_days = (target_weekday - first_day.weekday() + 7) % 7
-        target_date = first_day + timedelta(days=delta_days) + timedelta(weeks=nth-1)
+        target_ordinal = nth_weekday_ordinal(year, month, target_weekday, nth)
+        if target_ordinal is None:
+            return None
         
-        if target_date.month == month:
-            self._record_traditional_event(target_date, target_date + timedelta(days=1), name, "公历动态节日")
-            return target_date
-        return None
-
-    def create_event(self, start_dt, end_dt, summary, description="", is_allday=True):
-        unique_str = f"{start_dt.strftime('%Y%m%d')}-{summary}"
-        uid_hash = hashlib.md5(unique_str.encode()).hexdigest()[:12]
+        target_date = datetime.fromordinal(target_ordinal)
+        self._record_traditional_event(target_date, target_date + timedelta(days=1), name, "公历动态节日")
+        return target_date
+
+    def load_lunar_tables(self, wanted_years):
+        # 逐日农历数据表只依赖历法本身，命中时整个计算过程不再调用 lunar_python；
+        # 这里只载入校验通过的年份，缺失的由 compute_traditional_year 生成。返回文件中全部年份，供回写
+        if not os.path.exists(LUNAR_TABLE_FILENAME):
+            return {}
+        try:
+            table_data = load_cache_file(LUNAR_TABLE_FILENAME)
+        except Exception as e:
+            print(f"读取农历数据表失败: {e}，将重新生成...")
+            return {}
+        if table_data.get("names") != {k: list(v) for k, v in LUNAR_TABLE_NAMES.items()}:
+            print("农历数据表编号已改变，准备重新生成...")
+            return {}
+
+        years = table_data.get("years", {})
+        for year in wanted_years:
+            columns = years.get(str(year))
+            if columns and columns.get("md5") == calculate_columns_md5(columns):
+                self.lunar_tables[year] = columns
+        return years
+
+    def save_lunar_tables(self, years):
+        print("正在保存逐日农历数据表...")
+        table_data = {
+            "names": LUNAR_TABLE_NAMES,
+            "years": years
+        }
+        dump_cache_file(LUNAR_TABLE_FILENAME, table_data)
+
+    def add_lunar_table_events(self, year, table):
+        months, days, jieqis = table["month"], table["day"], table["jieqi"]
+        shujius, fus, gans, zhis = table["shujiu"], table["fu"], table["gan"], table["zhi"]
+        first_day = datetime(year, 1, 1)
+
+        def record(i, summary, description):
+            dt = first_day + timedelta(days=i)
+            self._record_traditional_event(dt, dt + timedelta(days=1), summary, description)
+
+        for i in range(len(months)):
+            if jieqis[i]:
+                jie_qi = JIE_QI_NAMES[jieqis[i]]
+                record(i, jie_qi, "二十四节气")
+                if jie_qi == "清明" and i > 0:
+                    record(i - 1, "寒食节", "传统节日")
+                elif jie_qi == "芒种":
+                    # 芒种后逢丙入梅，天干十日一轮
+                    rumei = find_index(gans, TIAN_GAN.index("丙"), i, 10)
+                    if rumei is not None: record(rumei, "入梅", "节气民俗")
+                elif jie_qi == "小暑":
+                    # 小暑后逢未出梅，地支十二日一轮
+                    chumei = find_index(zhis, DI_ZHI.index("未"), i, 12)
+                    if chumei is not None: record(chumei, "出梅", "节气民俗")
+
+            if shujius[i]:
+                record(i, SHU_JIU_NAMES[shujius[i]], "节气民俗")
+
+            if fus[i]:
+                fu_name = FU_NAMES[fus[i]]
+                record(i, "入伏" if fu_name == "初伏" else fu_name, "节气民俗")
+
+            l_month, l_day = months[i], days[i]
+            if l_day == 1 and l_month in (1, 11, 12):
+                m_name = {1: "正", 11: "冬", 12: "腊"}[l_month]
+                record(i, f"进入{m_name}月", "农历月份")
+
+            if (l_month, l_day) in FIXED_FESTIVALS_LUNAR:
+                record(i, FIXED_FESTIVALS_LUNAR[(l_month, l_day)], "传统节日")
+
+            if l_month == 1 and l_day == 1:
+                record(i, "春节", "传统节日")
+                if i > 0: record(i - 1, "除夕", "传统节日")
+
+    def create_event(self, start_dt, end_dt, summary, description="", is_allday=True, ymd_str=None, uid_seed=None, uid_hash=None):
+        # ymd_str / uid_seed 可由调用方预先算好，同日多个事件共用；
+        # 从缓存加载时直接带上已算好的 uid_hash，不再计算 md5
+        if ymd_str is None: ymd_str = start_dt.strftime("%Y%m%d")
+        if uid_hash is None:
+            if uid_seed is None: uid_seed = hashlib.md5(f"{ymd_str}-".encode())
+            uid_md5 = uid_seed.copy()
+            uid_md5.update(summary.encode())
+            uid_hash = uid_md5.hexdigest()[:12]
         
-        self.events.append({
-            "dtstart": format_ics_date(start_dt, is_allday),
-            "dtend": format_ics_date(end_dt, is_allday),
-            "uid": generate_uid(start_dt.strftime("%Y%m%d"), uid_hash),
-            "created": get_now_utc_stamp(),
-            "description": description,
-            "summary": summary,
-            "status": "CONFIRMED",
-            "transp": "TRANSPARENT",
-            "is_allday": is_allday
-        })
-
-    def generate_ics_content(self, update_time_str):
-        lines = [
+        self.events.append(Event(
+            dtstart=ymd_str if is_allday else format_ics_date(start_dt, False),
+            dtend=format_ics_date(end_dt, is_allday),
+            uid=generate_uid(ymd_str, uid_hash),
+            created=self.now_stamp,
+            description=description,
+            summary=summary,
+            status=STATUS_CONFIRMED,
+            transp=TRANSP_TRANSPARENT,
+            is_allday=is_allday
+        ))
+        return uid_hash
+
+    def write_ics(self, write, update_time_str):
+        # 逐行编码后直接交给 write，不再拼出整份文件的中间字符串
+        header = [
             "BEGIN:VCALENDAR",
             "PRODID:-//365day.top//China Public Holidays 2.0//CN",
             "VERSION:2.0",
@@ -429,74 +670,102 @@ class CalendarGenerator:
             "END:STANDARD",
             "END:VTIMEZONE"
         ]
+        write("\r\n".join(header).encode('utf-8') + ICS_CRLF)
         
-        self.events.sort(key=lambda x: x['dtstart'])
-        now_stamp = get_now_utc_stamp()
+        dtstamp_line = f"DTSTAMP:{self.now_stamp}".encode('utf-8') + ICS_CRLF
+        last_modified_line = f"LAST-MODIFIED:{self.now_stamp}".encode('utf-8') + ICS_CRLF
+
+        def line(text):
+            write(text.encode('utf-8') + ICS_CRLF)
         
         for ev in self.events:
-            lines.append("BEGIN:VEVENT")
-            if ev['is_allday']:
-                lines.append(f"DTSTART;VALUE=DATE:{ev['dtstart']}")
-                lines.append(f"DTEND;VALUE=DATE:{ev['dtend']}")
+            write(ICS_VEVENT_BEGIN)
+            if ev.is_allday:
+                line(f"DTSTART;VALUE=DATE:{ev.dtstart}")
+                line(f"DTEND;VALUE=DATE:{ev.dtend}")
             else:
-                lines.append(f"DTSTART;TZID={TZ_ID}:{ev['dtstart']}")
-                lines.append(f"DTEND;TZID={TZ_ID}:{ev['dtend']}")
+                line(f"DTSTART;TZID={TZ_ID}:{ev.dtstart}")
+                line(f"DTEND;TZID={TZ_ID}:{ev.dtend}")
                 
-            lines.append(f"DTSTAMP:{now_stamp}")
-            lines.append(f"UID:{ev['uid']}")
-            lines.append(f"CREATED:{ev['created']}")
-            if ev['description']: lines.append(fold_line(f"DESCRIPTION:{ev['description']}"))
-            lines.append(f"LAST-MODIFIED:{now_stamp}")
-            lines.append(f"STATUS:{ev['status']}")
-            lines.append(fold_line(f"SUMMARY:{ev['summary']}"))
-            lines.append(f"TRANSP:{ev['transp']}")
+            write(dtstamp_line)
+            line(f"UID:{ev.uid}")
+            line(f"CREATED:{ev.created}")
+            if ev.description: write(fold_line(f"DESCRIPTION:{ev.description}") + ICS_CRLF)
+            write(last_modified_line)
+            line(f"STATUS:{ev.status}")
+            write(fold_line(f"SUMMARY:{ev.summary}") + ICS_CRLF)
+            line(f"TRANSP:{ev.transp}")
             
-            if 'alarm' in ev:
-                lines.append("BEGIN:VALARM")
-                lines.append("TRIGGER:-P1D")
-                lines.append("ACTION:DISPLAY")
-                lines.append(fold_line(f"DESCRIPTION:{ev['alarm']}"))
-                lines.append("END:VALARM")
+            if ev.alarm:
+                write(ICS_VALARM_BEGIN)
+                write(fold_line(f"DESCRIPTION:{ev.alarm}") + ICS_CRLF)
+                write(ICS_VALARM_END)
             
-            lines.append("END:VEVENT")
+            write(ICS_VEVENT_END)
             
-        lines.append("END:VCALENDAR")
-        return "\r\n".join(lines)
+        write(ICS_VCALENDAR_END)
+
+    def calculate_content_md5(self):
+        # CREATED 每次运行都会变，不计入摘要；年份范围会写进日历头部，一并计入
+        content = {
+            "range": [TRADITIONAL_START_YEAR, TRADITIONAL_END_YEAR],
+            "events": [[ev.dtstart, ev.dtend, ev.uid, ev.description, ev.summary, ev.status, ev.transp, ev.is_allday, ev.alarm]
+                       for ev in self.events]
+        }
+        return hashlib.md5(json.dumps(content, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+    def compare_with_old_file(self, current_display_time):
+        if not os.path.exists(OUTPUT_FILENAME):
+            return False, ""
+        # 按字节读取，保留 CRLF，才能与新内容逐字比较
+        with open(OUTPUT_FILENAME, 'rb') as f:
+            old_content = f.read().decode('utf-8')
+        match = UPDATE_TIME_RE.search(old_content)
+        old_display_time = match.group(1) if match else ""
+        new_content_full = bytearray()
+        self.write_ics(new_content_full.extend, current_display_time)
+        return self.is_content_same(old_content, new_content_full.decode('utf-8')), old_display_time
 
     def save_file(self):
         current_display_time = get_now_display()
-        new_content_full = self.generate_ics_content(current_display_time)
-        old_content = ""
-        old_display_time = ""
-        
-        if os.path.exists(OUTPUT_FILENAME):
-            with open(OUTPUT_FILENAME, 'r', encoding='utf-8') as f:
-                old_content = f.read()
-            match = re.search(r"更新时间(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})", old_content)
-            if match: old_display_time = match.group(1)
-        
-        if self.is_content_same(old_content, new_content_full):
+        self.events.sort(key=attrgetter('sortkey'))
+        content_md5 = self.calculate_content_md5()
+
+        saved = {}
+        if os.path.exists(OUTPUT_FILENAME) and os.path.exists(OUTPUT_HASH_FILENAME):
+            try:
+                with open(OUTPUT_HASH_FILENAME, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except Exception as e:
+                print(f"读取日历摘要失败: {e}，改为比较旧文件...")
+
+        if saved:
+            # 渲染前先比对事件摘要，无需读取旧文件，整份日历只渲染一次
+            is_same = saved.get("md5") == content_md5
+            old_display_time = saved.get("update_time", "")
+        else:
+            is_same, old_display_time = self.compare_with_old_file(current_display_time)
+
+        if is_same and old_display_time:
             print("文件内容无实质变化，保持更新时间不变。")
-            if old_display_time: final_content = self.generate_ics_content(old_display_time)
-            else: final_content = new_content_full
+            display_time = old_display_time
         else:
             print(f"检测到内容更新，更新时间戳为：{current_display_time}")
-            final_content = new_content_full
-            
-        with open(OUTPUT_FILENAME, 'w', encoding='utf-8', newline='') as f:
-            f.write(final_content)
+            display_time = current_display_time
+
+        with open(OUTPUT_FILENAME, 'wb') as f:
+            self.write_ics(f.write, display_time)
+        with open(OUTPUT_HASH_FILENAME, 'w', encoding='utf-8') as f:
+            json.dump({"md5": content_md5, "update_time": display_time}, f, ensure_ascii=False, indent=2)
 
     def is_content_same(self, old_text, new_text):
         if not old_text: return False
         def clean(text):
-            text = re.sub(r"更新时间\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", "", text)
-            text = re.sub(r"DTSTAMP:.*", "", text)
-            text = re.sub(r"LAST-MODIFIED:.*", "", text)
-            text = re.sub(r"CREATED:.*", "", text)
-            return text.strip()
+            return VOLATILE_RE.sub("", text).strip()
         return clean(old_text) == clean(new_text)
 
     def run(self):
+        self.now_stamp = get_now_utc_stamp()
         self.ensure_data_file()
         self.parse_holidays()
         self.process_holiday_events()
@@ -504,6 +773,16 @@ class CalendarGenerator:
         self.save_file()
         print(f"全部生成完成: {OUTPUT_FILENAME}")
 
+def compute_traditional_year(year, table=None):
+    # 供进程池调用的顶层函数：缺表时先生成该年的逐日农历数据表，再算出该年的民俗缓存条目
+    if table is None:
+        table = build_lunar_table(year)
+        table["md5"] = calculate_columns_md5(table)
+    generator = CalendarGenerator()
+    generator.lunar_tables[year] = table
+    generator.add_traditional_year(year)
+    return table, generator.traditional_cache_list
+
 if __name__ == "__main__":
     generator = CalendarGenerator()
     generator.run()
\ No newline at end of file